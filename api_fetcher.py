@@ -1,3 +1,5 @@
+from threading import Lock
+
 from healthcheck.common_funcs import http_get
 from healthcheck.printer_funcs import print_msg, print_success, print_error
 
@@ -16,6 +18,8 @@ class ApiFetcher(object):
         self.username = _config['api']['user']
         self.password = _config['api']['pass']
         self.cache = {}
+        self.locks = {}
+        self.lock = Lock()
         self.uids = {}
         self.connected = None
 
@@ -65,6 +69,8 @@ class ApiFetcher(object):
         """
         Get a topic.
 
+        Topics are fetched only once per run, subsequent calls are served from cache.
+
         :param _topic: The topic, e.g. 'nodes'
         :return: The result dictionary.
         """
@@ -120,6 +126,21 @@ class ApiFetcher(object):
         """
         return sum([node[_key] for node in self._fetch(_topic)])
 
+    def get_sums_of_values(self, _topic, _keys):
+        """
+        Get the sums of multiple values from a topic.
+
+        :param _topic: The topic, e.g. 'nodes'
+        :param _keys: The keys of the values.
+        :return: A dict mapping each key to the sum of its values.
+        """
+        sums = dict.fromkeys(_keys, 0)
+        for node in self._fetch(_topic):
+            for key in _keys:
+                sums[key] += node[key]
+
+        return sums
+
     def _fetch(self, _topic):
         """
         Fetch a topic.
@@ -127,9 +148,20 @@ class ApiFetcher(object):
         :param _topic: The topic, e.g. 'nodes'
         :return: The result dictionary.
         """
+        # lookup from cache
         if _topic in self.cache:
             return self.cache[_topic]
-        else:
+
+        # create lock if not existent
+        with self.lock:
+            if _topic not in self.locks:
+                self.locks[_topic] = Lock()
+
+        # fetch topic, concurrent callers of the same topic wait for the first one
+        with self.locks[_topic]:
+            if _topic in self.cache:
+                return self.cache[_topic]
+
             if ':' in self.addr:
                 url = 'https://{}/v1/{}'.format(self.addr, _topic)
             else:
@@ -45,7 +45,7 @@ class BaseCheckSuite(object):
     def get_remote_env_var(self, env_var):
         """
         Get an environment variable from remote machines.
-        """
-        env_vars = list(map(lambda x: x.result(), self.rex().exec_broad(fr'bash -lc "echo \${env_var}"')))
 
-        return env_vars[0]
+        The variable is read from the first remote machine only.
+        """
+        return self.rex().exec_uni(fr'bash -lc "echo \${env_var}"', self.rex().get_targets()[0])
@@ -1,7 +1,14 @@
 import re
+from threading import Lock
 
 from healthcheck.check_suites.base_suite import BaseCheckSuite
-from healthcheck.common_funcs import calc_usage, GB, to_gb, to_kops, to_percent
+from healthcheck.common_funcs import calc_usages, GB, to_gb, to_kops, to_percent
+
+MASTER_NODE_RE = re.compile(r'(^\*?node:\d+\s+master.*$)', re.MULTILINE)
+SHARD_PING_RE = re.compile(r'^(\d+):(.*)$', re.MULTILINE)
+SHARDS_LIMIT_RE = re.compile(r'Shards limit : (\d+)\n', re.MULTILINE | re.DOTALL)
+USAGE_KEYS = ['total_req', 'free_memory', 'ephemeral_storage_avail', 'persistent_storage_avail', 'ingress_bytes',
+              'egress_bytes']
 
 
 class Cluster(BaseCheckSuite):
@@ -9,6 +16,46 @@ class Cluster(BaseCheckSuite):
     Check configuration, status and usage of the cluster.
     """
 
+    def __init__(self, _config):
+        """
+        :param _config: The configuration.
+        """
+        super().__init__(_config)
+        self.usage = {}
+        self.lock = Lock()
+
+    def _get_usage(self, _key):
+        """
+        Get usage of the cluster.
+
+        Calls '/v1/cluster/stats' from API and calculates min/avg/max/dev of all usage values in a single pass.
+
+        :param _key: The key of the value, e.g. 'total_req'
+        :return: A tuple (minimum, average, maximum, standard deviation).
+        :raise ValueError: If there are no values for the key.
+        """
+        # calculate once, concurrent callers wait for the first one
+        if not self.usage:
+            with self.lock:
+                if not self.usage:
+                    stats = self.api().get('cluster/stats')
+                    self.usage = calc_usages(stats['intervals'], USAGE_KEYS)
+
+        if _key not in self.usage:
+            raise ValueError(f'no values for {_key}')
+
+        return self.usage[_key]
+
+    def _get_rladmin_status(self):
+        """
+        Get the output of `rladmin status` from one of the cluster nodes.
+
+        :return: The output.
+        """
+        install_dir = self.get_remote_env_var('installdir')
+
+        return self.rex().exec_uni(f'{install_dir}/bin/rladmin status', self.rex().get_targets()[0], True)
+
     def check_cluster_config_001(self, _params):
         """CC-001: Check cluster sizing.
 
@@ -21,10 +68,12 @@ class Cluster(BaseCheckSuite):
         :returns: result
         """
         number_of_nodes = self.api().get_number_of_values('nodes')
-        number_of_cores = self.api().get_sum_of_values('nodes', 'cores')
-        total_memory = self.api().get_sum_of_values('nodes', 'total_memory')
-        epehemeral_storage_size = self.api().get_sum_of_values('nodes', 'ephemeral_storage_size')
-        persistent_storage_size = self.api().get_sum_of_values('nodes', 'persistent_storage_size')
+        sums = self.api().get_sums_of_values('nodes', ['cores', 'total_memory', 'ephemeral_storage_size',
+                                                       'persistent_storage_size'])
+        number_of_cores = sums['cores']
+        total_memory = sums['total_memory']
+        epehemeral_storage_size = sums['ephemeral_storage_size']
+        persistent_storage_size = sums['persistent_storage_size']
 
         if not _params:
             info = {'number of nodes': str(number_of_nodes),
@@ -62,10 +111,9 @@ class Cluster(BaseCheckSuite):
         :param _params: None
         :returns: result
         """
-        install_dir = self.get_remote_env_var('installdir')
-        rsp = self.rex().exec_uni(f'{install_dir}/bin/rladmin status', self.rex().get_targets()[0], True)
-        found = re.search(r'(^\*?node:\d+\s+master.*$)', rsp, re.MULTILINE)
-        parts = re.split(r'\s+', found.group(1))
+        rex = True  # remote executor is called in subroutine
+        found = MASTER_NODE_RE.search(self._get_rladmin_status())
+        parts = found.group(1).split()
 
         return None, {'uid': self.api().get_uid(parts[2]), 'address': parts[2], 'external address': parts[3]}
 
@@ -102,7 +150,7 @@ class Cluster(BaseCheckSuite):
         if 'shards_limit' in _license:
             shards_limit = int(_license['shards_limit'])
         else:
-            match = re.search(r'Shards limit : (\d+)\n', self.api().get('license')['license'], re.MULTILINE | re.DOTALL)
+            match = SHARDS_LIMIT_RE.search(_license['license'])
             shards_limit = int(match.group(1))
 
         result = shards_limit >= number_of_shards and not expired
@@ -146,7 +194,8 @@ class Cluster(BaseCheckSuite):
     def check_cluster_status_002(self, _params):
         """CS-002: Check cluster shards.
 
-        Calls '/v1/shards' from API and executes `shard-cli <UID> PING` for every shard UID on one of the cluster nodes.
+        Calls '/v1/shards' from API and executes `shard-cli <UID> PING` for every shard UID in a single shell loop
+        on one of the cluster nodes.
         Collects the responses and compares it against 'PONG'.
 
         Remedy: Investigate the failed shard, i.e. grep log files for errors.
@@ -156,8 +205,13 @@ class Cluster(BaseCheckSuite):
         """
         info = {}
         install_dir = self.get_remote_env_var('installdir')
-        for shard in self.api().get('shards'):
-            ping_rsp = self.rex().exec_uni(f'{install_dir}/bin/shard-cli {shard["uid"]} PING', self.rex().get_targets()[0], True)
+        shards = self.api().get('shards')
+        uids = ' '.join(str(shard['uid']) for shard in shards)
+        cmd = fr'bash -c "for uid in {uids}; do echo \$uid:\$({install_dir}/bin/shard-cli \$uid PING); done"'
+        rsp = self.rex().exec_uni(cmd, self.rex().get_targets()[0], True)
+        ping_rsps = dict(SHARD_PING_RE.findall(rsp))
+        for shard in shards:
+            ping_rsp = ping_rsps.get(str(shard['uid']))
             if ping_rsp != 'PONG' or shard['status'] != 'active' or shard['detailed_status'] != 'ok':
                 info[f'shard:{shard["uid"]}'] = shard
 
@@ -166,7 +220,7 @@ class Cluster(BaseCheckSuite):
     def check_cluster_status_003(self, _params):
         """CS-003: Check if `rladmin status` has errors.
 
-        Executes `rladmin status | grep -v endpoint | grep node` on one of the cluster nodes.
+        Executes `rladmin status` on one of the cluster nodes and filters node lines which are not endpoint lines.
         Collects output and compares against 'OK'.
 
         Remedy: Investigate the failed node, i.e. grep log files for errors.
@@ -174,10 +228,9 @@ class Cluster(BaseCheckSuite):
         :param _params: None
         :returns: result
         """
-        install_dir = self.get_remote_env_var('installdir')
-        rsp = self.rex().exec_uni(f'{install_dir}/bin/rladmin status | grep -v endpoint | grep node',
-                                  self.rex().get_targets()[0], True)
-        not_ok = re.findall(r'^((?!OK).)*$', rsp, re.MULTILINE)
+        rex = True  # remote executor is called in subroutine
+        lines = [line for line in self._get_rladmin_status().splitlines() if 'node' in line and 'endpoint' not in line]
+        not_ok = [line for line in lines if 'OK' not in line]
 
         return len(not_ok) == 0, {'not OK': len(not_ok)} if not_ok else {'OK': 'all'}
 
@@ -192,9 +245,9 @@ class Cluster(BaseCheckSuite):
         :returns: result
         """
         alerts = self.api().get('cluster/alerts')
-        enableds = list(filter(lambda x: x[1]['state'], alerts.items()))
+        enableds = {name: alert for name, alert in alerts.items() if alert['state']}
 
-        return not enableds, dict(enableds)
+        return not enableds, enableds
 
     def check_cluster_usage_001(self, _params):
         """CU-001: Get throughput of cluster.
@@ -204,15 +257,14 @@ class Cluster(BaseCheckSuite):
         :param _params: None
         :returns: result
         """
+        api = True  # API is called in subroutine
         info = {}
-        stats = self.api().get('cluster/stats')
-
-        minimum, average, maximum, std_dev = calc_usage(stats['intervals'], 'total_req')
+        minimum, average, maximum, std_dev = self._get_usage('total_req')
 
-        info['min'] = '{} Kops'.format(to_kops(minimum))
-        info['avg'] = '{} Kops'.format(to_kops(average))
-        info['max'] = '{} Kops'.format(to_kops(maximum))
-        info['dev'] = '{} Kops'.format(to_kops(std_dev))
+        info['min'] = f'{to_kops(minimum)} Kops'
+        info['avg'] = f'{to_kops(average)} Kops'
+        info['max'] = f'{to_kops(maximum)} Kops'
+        info['dev'] = f'{to_kops(std_dev)} Kops'
 
         return None, info
 
@@ -225,16 +277,15 @@ class Cluster(BaseCheckSuite):
         :returns: result
         """
         info = {}
-        stats = self.api().get('cluster/stats')
-
-        minimum, average, maximum, std_dev = calc_usage(stats['intervals'], 'free_memory')
+        minimum, average, maximum, std_dev = self._get_usage('free_memory')
 
         total_mem = self.api().get_sum_of_values('nodes', 'total_memory')
+        inv_total = 100 / total_mem
 
-        info['min'] = '{} GB ({} %)'.format(to_gb(total_mem - maximum), to_percent((100 / total_mem) * (total_mem - maximum)))
-        info['avg'] = '{} GB ({} %)'.format(to_gb(total_mem - average), to_percent((100 / total_mem) * (total_mem - average)))
-        info['max'] = '{} GB ({} %)'.format(to_gb(total_mem - minimum), to_percent((100 / total_mem) * (total_mem - minimum)))
-        info['dev'] = '{} GB ({} %)'.format(to_gb(std_dev), to_percent((100 / total_mem) * std_dev))
+        info['min'] = f'{to_gb(total_mem - maximum)} GB ({to_percent(inv_total * (total_mem - maximum))} %)'
+        info['avg'] = f'{to_gb(total_mem - average)} GB ({to_percent(inv_total * (total_mem - average))} %)'
+        info['max'] = f'{to_gb(total_mem - minimum)} GB ({to_percent(inv_total * (total_mem - minimum))} %)'
+        info['dev'] = f'{to_gb(std_dev)} GB ({to_percent(inv_total * std_dev)} %)'
 
         return None, info
 
@@ -248,16 +299,15 @@ class Cluster(BaseCheckSuite):
         :returns: result
         """
         info = {}
-        stats = self.api().get('cluster/stats')
+        minimum, average, maximum, std_dev = self._get_usage('ephemeral_storage_avail')
 
-        minimum, average, maximum, std_dev = calc_usage(stats['intervals'], 'ephemeral_storage_avail')
+        total_size = self.api().get_sum_of_values('nodes', 'ephemeral_storage_size')
+        inv_total = 100 / total_size
 
-        total_size = self.api().get_sum_of_values(f'nodes', 'ephemeral_storage_size')
-
-        info['min'] = '{} GB ({} %)'.format(to_gb(total_size - maximum), to_percent((100 / total_size) * (total_size - maximum)))
-        info['avg'] = '{} GB ({} %)'.format(to_gb(total_size - average), to_percent((100 / total_size) * (total_size - average)))
-        info['max'] = '{} GB ({} %)'.format(to_gb(total_size - minimum), to_percent((100 / total_size) * (total_size - minimum)))
-        info['dev'] = '{} GB ({} %)'.format(to_gb(std_dev), to_percent((100 / total_size) * std_dev))
+        info['min'] = f'{to_gb(total_size - maximum)} GB ({to_percent(inv_total * (total_size - maximum))} %)'
+        info['avg'] = f'{to_gb(total_size - average)} GB ({to_percent(inv_total * (total_size - average))} %)'
+        info['max'] = f'{to_gb(total_size - minimum)} GB ({to_percent(inv_total * (total_size - minimum))} %)'
+        info['dev'] = f'{to_gb(std_dev)} GB ({to_percent(inv_total * std_dev)} %)'
 
         return None, info
 
@@ -271,16 +321,15 @@ class Cluster(BaseCheckSuite):
         :returns: result
         """
         info = {}
-        stats = self.api().get('cluster/stats')
-
-        minimum, average, maximum, std_dev = calc_usage(stats['intervals'], 'persistent_storage_avail')
+        minimum, average, maximum, std_dev = self._get_usage('persistent_storage_avail')
 
-        total_size = self.api().get_sum_of_values(f'nodes', 'persistent_storage_size')
+        total_size = self.api().get_sum_of_values('nodes', 'persistent_storage_size')
+        inv_total = 100 / total_size
 
-        info['min'] = '{} GB ({} %)'.format(to_gb(total_size - maximum), to_percent((100 / total_size) * (total_size - maximum)))
-        info['avg'] = '{} GB ({} %)'.format(to_gb(total_size - average), to_percent((100 / total_size) * (total_size - average)))
-        info['max'] = '{} GB ({} %)'.format(to_gb(total_size - minimum), to_percent((100 / total_size) * (total_size - minimum)))
-        info['dev'] = '{} GB ({} %)'.format(to_gb(std_dev), to_percent((100 / total_size) * std_dev))
+        info['min'] = f'{to_gb(total_size - maximum)} GB ({to_percent(inv_total * (total_size - maximum))} %)'
+        info['avg'] = f'{to_gb(total_size - average)} GB ({to_percent(inv_total * (total_size - average))} %)'
+        info['max'] = f'{to_gb(total_size - minimum)} GB ({to_percent(inv_total * (total_size - minimum))} %)'
+        info['dev'] = f'{to_gb(std_dev)} GB ({to_percent(inv_total * std_dev)} %)'
 
         return None, info
 
@@ -292,22 +341,21 @@ class Cluster(BaseCheckSuite):
         :param _params:
         :return:
         """
+        api = True  # API is called in subroutine
         info = {}
-        stats = self.api().get('cluster/stats')
-
-        minimum, average, maximum, std_dev = calc_usage(stats['intervals'], 'ingress_bytes')
+        minimum, average, maximum, std_dev = self._get_usage('ingress_bytes')
         info['ingress'] = {
-            'min': '{} GB/s'.format(to_gb(minimum)),
-            'avg': '{} GB/s'.format(to_gb(average)),
-            'max': '{} GB/s'.format(to_gb(maximum)),
-            'dev': '{} GB/s'.format(to_gb(std_dev)),
+            'min': f'{to_gb(minimum)} GB/s',
+            'avg': f'{to_gb(average)} GB/s',
+            'max': f'{to_gb(maximum)} GB/s',
+            'dev': f'{to_gb(std_dev)} GB/s',
         }
-        minimum, average, maximum, std_dev = calc_usage(stats['intervals'], 'egress_bytes')
+        minimum, average, maximum, std_dev = self._get_usage('egress_bytes')
         info['egress'] = {
-            'min': '{} GB/s'.format(to_gb(minimum)),
-            'avg': '{} GB/s'.format(to_gb(average)),
-            'max': '{} GB/s'.format(to_gb(maximum)),
-            'dev': '{} GB/s'.format(to_gb(std_dev)),
+            'min': f'{to_gb(minimum)} GB/s',
+            'avg': f'{to_gb(average)} GB/s',
+            'max': f'{to_gb(maximum)} GB/s',
+            'dev': f'{to_gb(std_dev)} GB/s',
         }
 
         return None, info
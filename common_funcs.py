@@ -1,5 +1,4 @@
 import base64
-import functools
 import json
 import math
 import logging
@@ -24,15 +23,41 @@ def calc_usage(_values, _key):
     :param _values: A list of value dicts.
     :param _key: The key of the value.
     :return: A tuple (minimum, average, maximum, standard deviation).
+    :raise ValueError: If there are no values for the key.
     """
-    vals = list(filter(lambda x: x.get(_key), _values))
-    min_ = min([i[_key] for i in vals])
-    avg = sum(i[_key] for i in vals) / len(vals)
-    max_ = max([i[_key] for i in filter(lambda i: i.get(_key), vals)])
-    q_sum = functools.reduce(lambda x, y: x + pow(y[_key] - avg, 2), vals, 0)
-    std_dev = math.sqrt(q_sum / len(vals))
+    usages = calc_usages(_values, [_key])
+    if _key not in usages:
+        raise ValueError(f'no values for {_key}')
 
-    return min_, avg, max_, std_dev
+    return usages[_key]
+
+
+def calc_usages(_values, _keys):
+    """
+    Calculate minimum, average, maximum and standard deviation of multiple keys in a single pass.
+
+    :param _values: A list of value dicts.
+    :param _keys: The keys of the values.
+    :return: A dict mapping each key with values to a tuple (minimum, average, maximum, standard deviation).
+    """
+    # collect the values of each key in one pass, reductions run on the plain lists
+    columns = {key: [] for key in _keys}
+    for value in _values:
+        for key, column in columns.items():
+            val = value.get(key)
+            if val:
+                column.append(val)
+
+    usages = {}
+    for key, column in columns.items():
+        if not column:
+            continue
+
+        avg = sum(column) / len(column)
+        q_sum = sum([(val - avg) * (val - avg) for val in column])
+        usages[key] = min(column), avg, max(column), math.sqrt(q_sum / len(column))
+
+    return usages
 
 
 def parse_semver(_version):
@@ -10,6 +10,7 @@ from healthcheck.check_suites.base_suite import BaseCheckSuite
 from healthcheck.check_executor import CheckExecutor
 from healthcheck.common_funcs import get_parameter_map_name, is_api_configured, is_rex_configured
 from healthcheck.printer_funcs import print_list, print_error, print_warning
+from healthcheck.remote_executor import RemoteExecutor
 from healthcheck.stats_collector import StatsCollector
 
 EXECUTOR_TIMEOUT = 600
@@ -242,6 +243,8 @@ def main():
 
     checks = find_checks(suites, args, config)
     exec_checks(suites, checks, args, render, collect_stats)
+    if RemoteExecutor._instance:
+        RemoteExecutor._instance.shutdown()
     renderer.render_stats(stats_collector)
 
     logging.shutdown()
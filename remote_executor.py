@@ -1,16 +1,25 @@
+import os
+from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor, wait
-from threading import Lock
+from threading import BoundedSemaphore, Lock
 
 from healthcheck.common_funcs import exec_cmd
 from healthcheck.printer_funcs import print_msg, print_success, print_error
 
 SSH_OPTS = ['-o', 'ControlMaster=auto',
-            '-o', 'ControlPersist=60s',
+            '-o', 'ControlPath=~/.ssh/ps-diag-cm-%C',
+            '-o', 'ControlPersist=600s',  # covers EXECUTOR_TIMEOUT of main, masters stay open for a whole run
+            '-o', 'ServerAliveInterval=30',
             '-o', 'StrictHostKeyChecking=no',
             '-o', 'UserKnownHostsFile=/dev/null',
             '-o', 'IdentitiesOnly=yes',
             '-o', 'AddKeysToAgent=no']
 
+# stay below the default 'MaxSessions 10' of sshd
+MAX_SESSIONS = 8
+# more parallel remote executions do not improve the wall time
+MAX_WORKERS = 32
+
 
 class RemoteExecutor(object):
     """
@@ -30,23 +39,30 @@ class RemoteExecutor(object):
         self.mode = None
 
         if 'ssh' in _config:
-            self.targets = list(map(lambda x: x.strip(), _config['ssh']['hosts'].split(',')))
+            self.targets = [target.strip() for target in _config['ssh']['hosts'].split(',')]
             self.ssh_user = _config['ssh']['user']
             self.ssh_key = _config['ssh']['key']
             self.mode = 'ssh'
+            # ssh fails if the directory of the control socket is missing
+            os.makedirs(os.path.expanduser('~/.ssh'), mode=0o700, exist_ok=True)
         elif 'docker' in _config:
-            self.targets = list(map(lambda x: x.strip(), _config['docker']['containers'].split(',')))
+            self.targets = [target.strip() for target in _config['docker']['containers'].split(',')]
             self.mode = 'docker'
         elif 'k8s' in _config:
-            self.targets = list(map(lambda x: x.strip(), _config['k8s']['pods'].split(',')))
+            self.targets = [target.strip() for target in _config['k8s']['pods'].split(',')]
             self.k8s_ns = _config['k8s']['namespace']
             self.mode = 'k8s'
         else:
             raise ValueError('no valid remote executor found')
 
+        self.executor = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, max(8, len(self.targets) * 2)),
+                                           thread_name_prefix='rex')
         self.addrs = {}
-        self.locks = {}
-        self.cache = {}
+        self.locks = defaultdict(Lock)
+        self.lock = Lock()
+        self.cache = defaultdict(dict)
+        self.sessions = defaultdict(lambda: BoundedSemaphore(MAX_SESSIONS))
+        self.ready = set()
         self.connected = None
 
     @classmethod
@@ -65,18 +81,20 @@ class RemoteExecutor(object):
     def check_connection(self):
         """
         Check SSH connection.
+
+        Connects to all targets concurrently, which also opens the shared SSH master connections.
         """
         if self.connected is not None:
             return
 
         print_msg(f'checking {self.mode} connections ...')
-        for target in self.targets:
+        for future in sorted(self.exec_broad('pwd', True), key=lambda x: self.targets.index(x.target)):
             try:
-                self.exec_uni('pwd', target, True)
-                print_success(f'- successfully connected to {target}')
+                future.result()
+                print_success(f'- successfully connected to {future.target}')
                 self.connected = True
             except Exception as e:
-                print_error(f'could not connect to host {target}:', e)
+                print_error(f'could not connect to host {future.target}:', e)
                 self.connected = False
         print_msg('')
 
@@ -129,17 +147,19 @@ class RemoteExecutor(object):
         :return: The result.
         :raise Exception: If an error occurred.
         """
-        with ThreadPoolExecutor(max_workers=len(_cmd_targets)) as e:
-            futures = []
-            for cmd, target in _cmd_targets:
-                future = e.submit(self._exec, cmd, target, _su)
-                future.target = target
-                future.cmd = cmd
-                futures.append(future)
-            done, undone = wait(futures)
-            assert not undone
+        if not _cmd_targets:
+            return set()
 
-            return done
+        futures = []
+        for cmd, target in _cmd_targets:
+            future = self.executor.submit(self._exec, cmd, target, _su)
+            future.target = target
+            future.cmd = cmd
+            futures.append(future)
+        done, undone = wait(futures)
+        assert not undone
+
+        return done
 
     def exec_broad(self, _cmd, _su=False):
         """
@@ -150,17 +170,27 @@ class RemoteExecutor(object):
         :return: The results.
         :raise Exception: If an error occurred.
         """
-        with ThreadPoolExecutor(max_workers=len(self.targets)) as e:
-            futures = []
-            for target in self.targets:
-                future = e.submit(self.exec_uni, _cmd, target, _su)
-                future.target = target
-                future.cmd = _cmd
-                futures.append(future)
-            done, undone = wait(futures)
-            assert not undone
+        if not self.targets:
+            return set()
+
+        futures = []
+        for target in self.targets:
+            future = self.executor.submit(self.exec_uni, _cmd, target, _su)
+            future.target = target
+            future.cmd = _cmd
+            futures.append(future)
+        done, undone = wait(futures)
+        assert not undone
+
+        return done
+
+    def shutdown(self, _wait=True):
+        """
+        Shutdown the thread pool executor.
 
-            return done
+        :param _wait: Wait for pending executions.
+        """
+        return self.executor.shutdown(_wait)
 
     def _exec(self, _cmd, _target, _su=False):
         """
@@ -173,24 +203,43 @@ class RemoteExecutor(object):
         :raise Exception: If an error occurred.
         """
         # lookup from cache
-        if _target in self.cache and _cmd in self.cache[_target]:
+        if _cmd in self.cache[_target]:
             return self.cache[_target][_cmd]
 
         # build command
         cmd = self._build_cmd(_target, _cmd, _su)
 
-        # create lock if not existent
-        if _target not in self.locks:
-            self.locks[_target] = Lock()
-
-        # execute command
-        with self.locks[_target]:
-            rsp = exec_cmd(cmd)
+        # get locks of command and target, created on first access
+        with self.lock:
+            cmd_lock = self.locks[(_target, _cmd)]
+            target_lock = self.locks[_target]
+            sessions = self.sessions[_target]
+
+        # execute command, concurrent callers of the same command wait for the first one
+        with cmd_lock:
+            if _cmd in self.cache[_target]:
+                return self.cache[_target][_cmd]
+
+            if self.mode != 'ssh':
+                # no master connection to establish
+                rsp = exec_cmd(cmd)
+            elif _target in self.ready:
+                # master connection is established, commands share it concurrently
+                try:
+                    with sessions:
+                        rsp = exec_cmd(cmd)
+                except Exception:
+                    # connection may be lost, serialize again until it is re-established
+                    self.ready.discard(_target)
+                    raise
+            else:
+                # serialize until the first command established the master connection
+                with target_lock:
+                    rsp = exec_cmd(cmd)
+                self.ready.add(_target)
 
-        # put into cache
-        if _target not in self.cache:
-            self.cache[_target] = {}
-        self.cache[_target][_cmd] = rsp
+            # put into cache
+            self.cache[_target][_cmd] = rsp
 
         return rsp
 